@@ -17,7 +17,7 @@ import os
 # Ensure we can import tracker module
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from tracker import check_updates, list_packages
+from tracker import check_updates, count_packages
 
 
 def main():
@@ -26,14 +26,14 @@ def main():
     args = parser.parse_args()
 
     try:
-        active = list_packages(active_only=True)
+        active = count_packages(active_only=True)
         if not active:
             if not args.quiet:
                 print("📭 No active packages to check")
             return 0
 
         if not args.quiet:
-            print(f"🔍 Checking {len(active)} active package(s)...")
+            print(f"🔍 Checking {active} active package(s)...")
 
         updates = check_updates()
 
@@ -9,10 +9,11 @@ import sys
 from tracker import (
     add_package,
     check_updates,
+    count_packages,
     get_api_quota,
     get_package_details,
     get_tracking_url,
-    list_packages,
+    iter_packages,
     remove_package,
     STATUS_EMOJI,
 )
@@ -52,18 +53,18 @@ def cmd_check(args):
 
 def cmd_list(args):
     show_all = getattr(args, "all", False)
-    packages = list_packages(active_only=not show_all)
+    count = count_packages(active_only=not show_all)
 
-    if not packages:
+    if not count:
         print("📭 No packages being tracked")
         if not show_all:
             print("   (use --all to include inactive packages)")
         return
 
     title = "All packages" if show_all else "Active packages"
-    print(f"📦 {title} ({len(packages)}):\n")
+    print(f"📦 {title} ({count}):\n")
 
-    for pkg in packages:
+    for pkg in iter_packages(active_only=not show_all):
         emoji = STATUS_EMOJI.get(pkg["status"], "📦")
         active_mark = "" if pkg["active"] else " [INACTIVE]"
         desc = f' — {pkg["description"]}' if pkg["description"] else ""
@@ -3,15 +3,27 @@ PackageTracker — Core tracking library.
 Tracks shipments via 17track API. Outputs notifications to stdout for OpenClaw messaging.
 """
 
+import asyncio
+import atexit
+import hashlib
 import json
 import os
 import re
 import sqlite3
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from functools import lru_cache
 
+import aiohttp
 import httpx
 from dotenv import load_dotenv
 
+try:
+    import orjson
+except ImportError:  # fall back to stdlib json
+    orjson = None
+
 # ── Config ──────────────────────────────────────────────────────────
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -22,6 +34,26 @@ API_KEY = os.getenv("SEVENTEEN_TRACK_API_KEY", "")
 API_BASE = "https://api.17track.net/track/v2.2"
 DB_PATH = os.path.join(BASE_DIR, "data", "tracker.db")
 
+# 17track accepts at most 40 numbers per gettrackinfo request
+TRACK_BATCH_SIZE = 40
+TRACK_MAX_CONNECTIONS = 10
+
+# ── JSON ───────────────────────────────────────────────────────────
+
+def _dumps(obj, sort_keys: bool = False) -> str:
+    """Compact, UTF-8-preserving JSON for raw API responses stored in the DB."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else 0).decode()
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, sort_keys=sort_keys)
+
+
+def _loads(data: bytes):
+    """Parse an API response body."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
 # ── Status mapping ──────────────────────────────────────────────────
 
 STATUS_MAP = {
@@ -61,6 +93,14 @@ CARRIER_PATTERNS = [
     ("DHL", 100001, re.compile(r"^\d{10,11}$")),
 ]
 
+# All patterns as one alternation so detection is a single match call;
+# group g<i> corresponds to CARRIER_PATTERNS[i]
+_COMBINED_CARRIER_PATTERN = re.compile(
+    "|".join(f"(?P<g{i}>{pattern.pattern})" for i, (_, _, pattern) in enumerate(CARRIER_PATTERNS)),
+    re.I,
+)
+_CARRIER_BY_GROUP = [(name, code) for name, code, _ in CARRIER_PATTERNS]
+
 # ── Tracking URLs ──────────────────────────────────────────────────
 
 TRACKING_URLS = {
@@ -78,17 +118,19 @@ TRACKING_URLS = {
 
 FALLBACK_TRACKING_URL = "https://t.17track.net/en#nums={tn}"
 
+_TRACKING_URLS_LOWER = {name.lower(): url_tpl for name, url_tpl in TRACKING_URLS.items()}
+
 
+@lru_cache(maxsize=1024)
 def get_tracking_url(tracking_number: str, carrier: str | None = None) -> str:
     """Generate a clickable tracking URL for the given carrier.
     Falls back to 17track universal tracker if carrier is unknown."""
     tn = tracking_number.strip()
     if carrier:
         # Case-insensitive carrier lookup
-        carrier_lower = carrier.lower()
-        for name, url_tpl in TRACKING_URLS.items():
-            if name.lower() == carrier_lower:
-                return url_tpl.format(tn=tn)
+        url_tpl = _TRACKING_URLS_LOWER.get(carrier.lower())
+        if url_tpl:
+            return url_tpl.format(tn=tn)
     # Try auto-detect from tracking number pattern
     detected, _ = detect_carrier(tn)
     if detected and detected in TRACKING_URLS:
@@ -96,25 +138,39 @@ def get_tracking_url(tracking_number: str, carrier: str | None = None) -> str:
     return FALLBACK_TRACKING_URL.format(tn=tn)
 
 
+@lru_cache(maxsize=1024)
 def detect_carrier(tracking_number: str) -> tuple[str | None, int]:
     """Return (carrier_name, carrier_code). Code 0 = auto-detect."""
     tn = tracking_number.strip()
-    for name, code, pattern in CARRIER_PATTERNS:
-        if pattern.match(tn):
-            return name, code
+    m = _COMBINED_CARRIER_PATTERN.match(tn)
+    if m:
+        return _CARRIER_BY_GROUP[int(m.lastgroup[1:])]
     return None, 0  # let 17track auto-detect
 
 
 # ── Database ───────────────────────────────────────────────────────
 
+_CONN: sqlite3.Connection | None = None
+
+
 def get_db() -> sqlite3.Connection:
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("PRAGMA foreign_keys=ON")
-    _init_db(conn)
-    return conn
+    """Return the process-wide connection, opening and initializing it once."""
+    global _CONN
+    if _CONN is None:
+        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+        conn = sqlite3.connect(DB_PATH)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL only risks the last commits on power loss, not corruption
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA cache_size=-8000")  # 8 MB
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA mmap_size=268435456")  # 256 MB
+        conn.execute("PRAGMA foreign_keys=ON")
+        _init_db(conn)
+        atexit.register(conn.close)
+        _CONN = conn
+    return _CONN
 
 
 def _init_db(conn: sqlite3.Connection):
@@ -131,6 +187,7 @@ def _init_db(conn: sqlite3.Connection):
             last_checked TEXT,
             delivered_date TEXT,
             raw_data TEXT,
+            raw_data_hash BLOB,
             created_at TEXT DEFAULT (datetime('now')),
             updated_at TEXT DEFAULT (datetime('now')),
             active INTEGER DEFAULT 1
@@ -153,10 +210,62 @@ def _init_db(conn: sqlite3.Connection):
             registrations_used INTEGER DEFAULT 0,
             UNIQUE(api_name, month)
         );
+
+        -- Event lookups by package (and ORDER BY event_date DESC) use
+        -- idx_events_dedup below; tracking_number lookups use its UNIQUE autoindex
+        CREATE INDEX IF NOT EXISTS idx_packages_active
+            ON packages(active) WHERE active = 1;
     """)
+    # Event dedup index; normalise NULLs and drop duplicates first so it can be
+    # built on older databases
+    has_dedup_index = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='index' AND name='idx_events_dedup'"
+    ).fetchone()
+    if not has_dedup_index:
+        conn.executescript("""
+            UPDATE tracking_events
+                SET event_date = COALESCE(event_date, ''),
+                    description = COALESCE(description, '')
+                WHERE event_date IS NULL OR description IS NULL;
+            DELETE FROM tracking_events WHERE id NOT IN (
+                SELECT MIN(id) FROM tracking_events
+                GROUP BY package_id, event_date, description
+            );
+            CREATE UNIQUE INDEX idx_events_dedup
+                ON tracking_events(package_id, event_date, description);
+        """)
+    # Columns added after the initial schema
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(packages)")}
+    if "raw_data_hash" not in columns:
+        conn.execute("ALTER TABLE packages ADD COLUMN raw_data_hash BLOB")
     conn.commit()
 
 
+# Package updates from check_updates; a NULL last_event keeps the stored value
+_UPDATE_PKG = """UPDATE packages SET
+        status=?, last_checked=?, raw_data=?, raw_data_hash=?, updated_at=?,
+        last_event=COALESCE(?, last_event),
+        last_event_date=COALESCE(?, last_event_date)
+    WHERE id=?"""
+_UPDATE_PKG_DELIVERED = """UPDATE packages SET
+        status=?, last_checked=?, raw_data=?, raw_data_hash=?, updated_at=?,
+        last_event=COALESCE(?, last_event),
+        last_event_date=COALESCE(?, last_event_date),
+        delivered_date=?, active=0
+    WHERE id=?"""
+
+
+def _count_events(conn: sqlite3.Connection, pkg_ids: list[int]) -> dict[int, int]:
+    """Return {package_id: number of stored events} for the given packages."""
+    rows = conn.execute(
+        f"""SELECT package_id, COUNT(*) FROM tracking_events
+            WHERE package_id IN ({",".join("?" * len(pkg_ids))})
+            GROUP BY package_id""",
+        pkg_ids,
+    )
+    return {pkg_id: count for pkg_id, count in rows}
+
+
 # ── 17track API ────────────────────────────────────────────────────
 
 def _api_headers() -> dict:
@@ -166,6 +275,22 @@ def _api_headers() -> dict:
     }
 
 
+_HTTP_CLIENT: httpx.Client | None = None
+
+
+def _client() -> httpx.Client:
+    """Return the shared HTTP client so connections to 17track are reused."""
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is None:
+        _HTTP_CLIENT = httpx.Client(
+            timeout=30,
+            headers=_api_headers(),
+            limits=httpx.Limits(max_keepalive_connections=4),
+        )
+        atexit.register(_HTTP_CLIENT.close)
+    return _HTTP_CLIENT
+
+
 def _check_api_key():
     if not API_KEY:
         raise RuntimeError(
@@ -174,6 +299,10 @@ def _check_api_key():
         )
 
 
+# Per-process cache of registrations_used, keyed by month ("YYYY-MM")
+_USAGE_CACHE: dict[str, int] = {}
+
+
 def _increment_registration_count(conn: sqlite3.Connection):
     """Track monthly registration usage (free tier: 100/month)."""
     month = datetime.now(timezone.utc).strftime("%Y-%m")
@@ -185,15 +314,19 @@ def _increment_registration_count(conn: sqlite3.Connection):
         (month,),
     )
     conn.commit()
+    if month in _USAGE_CACHE:
+        _USAGE_CACHE[month] += 1
 
 
 def _get_registration_count(conn: sqlite3.Connection) -> int:
     month = datetime.now(timezone.utc).strftime("%Y-%m")
-    row = conn.execute(
-        "SELECT registrations_used FROM api_usage WHERE api_name='17track' AND month=?",
-        (month,),
-    ).fetchone()
-    return row["registrations_used"] if row else 0
+    if month not in _USAGE_CACHE:
+        row = conn.execute(
+            "SELECT registrations_used FROM api_usage WHERE api_name='17track' AND month=?",
+            (month,),
+        ).fetchone()
+        _USAGE_CACHE[month] = row["registrations_used"] if row else 0
+    return _USAGE_CACHE[month]
 
 
 def register_tracking(tracking_number: str, carrier_code: int = 0) -> dict:
@@ -204,40 +337,77 @@ def register_tracking(tracking_number: str, carrier_code: int = 0) -> dict:
     """
     _check_api_key()
     payload = [{"number": tracking_number, "carrier": carrier_code}]
-    with httpx.Client(timeout=30) as client:
-        resp = client.post(
-            f"{API_BASE}/register",
-            headers=_api_headers(),
-            json=payload,
+    resp = _client().post(f"{API_BASE}/register", json=payload)
+    resp.raise_for_status()
+    return _loads(resp.content)
+
+
+class EventLoopRunningError(RuntimeError):
+    """get_track_info() was called from inside a running asyncio event loop."""
+
+
+async def _get_track_info_async(session: aiohttp.ClientSession, numbers: list[str]) -> dict:
+    """Fetch one batch (max TRACK_BATCH_SIZE numbers) of tracking info."""
+    payload = [{"number": tn} for tn in numbers]
+    async with session.post(
+        f"{API_BASE}/gettrackinfo",
+        headers=_api_headers(),
+        json=payload,
+    ) as resp:
+        body = await resp.read()
+        if resp.status >= 400:
+            # Keep the 17track error body; raise_for_status() only has the reason phrase
+            raise aiohttp.ClientResponseError(
+                resp.request_info,
+                resp.history,
+                status=resp.status,
+                message=body.decode(errors="replace"),
+                headers=resp.headers,
+            )
+        return _loads(body)
+
+
+async def _gather_track_info(tracking_numbers: list[str]) -> list[dict]:
+    """Fetch all batches concurrently over a single pooled session."""
+    chunks = [
+        tracking_numbers[i:i + TRACK_BATCH_SIZE]
+        for i in range(0, len(tracking_numbers), TRACK_BATCH_SIZE)
+    ]
+    connector = aiohttp.TCPConnector(limit=TRACK_MAX_CONNECTIONS)
+    timeout = aiohttp.ClientTimeout(total=30)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        return await asyncio.gather(
+            *(_get_track_info_async(session, chunk) for chunk in chunks)
         )
-        resp.raise_for_status()
-        return resp.json()
 
 
 def get_track_info(tracking_numbers: list[str]) -> dict:
-    """Get tracking info for registered numbers (free, unlimited calls)."""
+    """Get tracking info for registered numbers (free, unlimited calls).
+
+    Numbers are split into batches of TRACK_BATCH_SIZE and fetched
+    concurrently; the accepted/rejected lists are merged into one response.
+    """
     _check_api_key()
-    payload = [{"number": tn} for tn in tracking_numbers]
-    with httpx.Client(timeout=30) as client:
-        resp = client.post(
-            f"{API_BASE}/gettrackinfo",
-            headers=_api_headers(),
-            json=payload,
-        )
-        resp.raise_for_status()
-        return resp.json()
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        raise EventLoopRunningError("get_track_info() cannot be called from a running event loop")
+    accepted, rejected = [], []
+    for result in asyncio.run(_gather_track_info(tracking_numbers)):
+        data = result.get("data", {})
+        accepted.extend(data.get("accepted", []))
+        rejected.extend(data.get("rejected", []))
+    return {"data": {"accepted": accepted, "rejected": rejected}}
 
 
 def get_quota() -> dict:
     """Get current 17track API quota information."""
     _check_api_key()
-    with httpx.Client(timeout=30) as client:
-        resp = client.get(
-            f"{API_BASE}/getquota",
-            headers=_api_headers(),
-        )
-        resp.raise_for_status()
-        return resp.json()
+    resp = _client().get(f"{API_BASE}/getquota")
+    resp.raise_for_status()
+    return _loads(resp.content)
 
 
 # ── Notifications ─────────────────────────────────────────────────
@@ -306,7 +476,6 @@ def add_package(
     ).fetchone()
     if existing:
         if existing["active"]:
-            conn.close()
             return {"ok": False, "error": f"Package {tracking_number} is already being tracked"}
         else:
             # Reactivate
@@ -315,7 +484,6 @@ def add_package(
                 (existing["id"],),
             )
             conn.commit()
-            conn.close()
             return {"ok": True, "message": "Package reactivated", "id": existing["id"]}
 
     # Detect carrier
@@ -328,70 +496,80 @@ def add_package(
     if used >= 95:
         print(f"⚠️  Warning: {used}/100 registrations used this month!")
     if used >= 100:
-        conn.close()
         return {
             "ok": False,
             "error": f"Monthly registration limit reached ({used}/100). "
                      "Wait for next month or upgrade your 17track plan.",
         }
 
-    # Register with 17track
+    # Register with 17track in the background while the package is saved locally
     register_result = None
     registered = False
-    try:
-        register_result = register_tracking(tracking_number, carrier_code)
-        data = register_result.get("data", {})
-        accepted = data.get("accepted", [])
-        rejected = data.get("rejected", [])
-
-        if accepted:
-            registered = True
-            _increment_registration_count(conn)
-            if accepted[0].get("carrier"):
-                carrier_code = accepted[0]["carrier"]
-        elif rejected:
-            err = rejected[0]
-            error_code = err.get("error", {}).get("code", -1)
-            error_msg = err.get("error", {}).get("message", "Unknown error")
-            # Code -18010012 = already registered, that's fine
-            if error_code == -18010012:
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(register_tracking, tracking_number, carrier_code)
+
+        try:
+            cursor = conn.execute(
+                """INSERT INTO packages
+                   (tracking_number, carrier, carrier_code, description)
+                   VALUES (?, ?, ?, ?)""",
+                (tracking_number, detected_carrier, carrier_code, description),
+            )
+            conn.commit()
+        except sqlite3.Error:
+            # 17track may already have counted the registration; keep the local quota in sync
+            if not future.cancel():
+                try:
+                    if future.result().get("data", {}).get("accepted"):
+                        _increment_registration_count(conn)
+                except Exception:
+                    pass
+            raise
+        pkg_id = cursor.lastrowid
+
+        try:
+            register_result = future.result()
+            data = register_result.get("data", {})
+            accepted = data.get("accepted", [])
+            rejected = data.get("rejected", [])
+
+            if accepted:
                 registered = True
-            else:
-                conn.close()
-                return {"ok": False, "error": f"17track rejected: {error_msg} (code {error_code})"}
-    except RuntimeError as e:
-        print(f"⚠️  {e}")
-        print("   Package saved locally — register with 17track after adding API key.")
-    except httpx.ConnectError:
-        print("⚠️  Could not connect to 17track API (network issue)")
-        print("   Package saved locally — will retry on next check.")
-    except Exception as e:
-        print(f"⚠️  17track registration failed: {e}")
-        print("   Package saved locally — will retry on next check.")
-
-    # Save to database
-    conn.execute(
-        """INSERT INTO packages
-           (tracking_number, carrier, carrier_code, description, raw_data)
-           VALUES (?, ?, ?, ?, ?)""",
-        (
-            tracking_number,
-            detected_carrier,
-            carrier_code,
-            description,
-            json.dumps(register_result) if register_result else None,
-        ),
-    )
-    conn.commit()
-
-    pkg = conn.execute(
-        "SELECT * FROM packages WHERE tracking_number = ?",
-        (tracking_number,),
-    ).fetchone()
+                _increment_registration_count(conn)
+                if accepted[0].get("carrier"):
+                    carrier_code = accepted[0]["carrier"]
+            elif rejected:
+                err = rejected[0]
+                error_code = err.get("error", {}).get("code", -1)
+                error_msg = err.get("error", {}).get("message", "Unknown error")
+                # Code -18010012 = already registered, that's fine
+                if error_code == -18010012:
+                    registered = True
+                else:
+                    conn.execute("DELETE FROM packages WHERE id=?", (pkg_id,))
+                    conn.commit()
+                    return {"ok": False, "error": f"17track rejected: {error_msg} (code {error_code})"}
+        except RuntimeError as e:
+            print(f"⚠️  {e}")
+            print("   Package saved locally — register with 17track after adding API key.")
+        except httpx.ConnectError:
+            print("⚠️  Could not connect to 17track API (network issue)")
+            print("   Package saved locally — will retry on next check.")
+        except Exception as e:
+            print(f"⚠️  17track registration failed: {e}")
+            print("   Package saved locally — will retry on next check.")
+
+    # Record the registration outcome
+    if register_result:
+        conn.execute(
+            "UPDATE packages SET carrier_code=?, raw_data=? WHERE id=?",
+            (carrier_code, _dumps(register_result), pkg_id),
+        )
+        conn.commit()
 
     result = {
         "ok": True,
-        "id": pkg["id"],
+        "id": pkg_id,
         "tracking_number": tracking_number,
         "carrier": detected_carrier or "Auto-detect",
         "registered_17track": registered,
@@ -401,7 +579,6 @@ def add_package(
     if registered:
         print(f"✅ Registered with 17track (quota: {_get_registration_count(conn)}/100 this month)")
 
-    conn.close()
     return result
 
 
@@ -425,7 +602,6 @@ def check_updates(package_id: int | None = None) -> list[dict]:
 
     if not packages:
         print("📭 No active packages to check")
-        conn.close()
         return []
 
     tracking_numbers = [p["tracking_number"] for p in packages]
@@ -433,21 +609,23 @@ def check_updates(package_id: int | None = None) -> list[dict]:
 
     try:
         result = get_track_info(tracking_numbers)
+    except EventLoopRunningError as e:
+        print(f"❌ {e}")
+        return []
     except RuntimeError as e:
         print(f"❌ API key error: {e}")
-        conn.close()
         return []
-    except httpx.ConnectError:
+    except aiohttp.ClientConnectionError:
         print("❌ Could not connect to 17track API — check your network")
-        conn.close()
         return []
-    except httpx.HTTPStatusError as e:
-        print(f"❌ 17track API returned HTTP {e.response.status_code}: {e.response.text[:200]}")
-        conn.close()
+    except aiohttp.ClientResponseError as e:
+        print(f"❌ 17track API returned HTTP {e.status}: {e.message[:200]}")
+        return []
+    except asyncio.TimeoutError:
+        print("❌ 17track API request timed out — try again later")
         return []
     except Exception as e:
         print(f"❌ Failed to fetch tracking info: {e}")
-        conn.close()
         return []
 
     data = result.get("data", {})
@@ -455,76 +633,94 @@ def check_updates(package_id: int | None = None) -> list[dict]:
 
     now = datetime.now(timezone.utc).isoformat()
 
+    pkg_by_tn = {p["tracking_number"]: p for p in packages}
+    event_rows: list[tuple] = []
+    package_rows: list[tuple] = []
+    delivered_rows: list[tuple] = []
+    unchanged_rows: list[tuple] = []
+    checked: list[tuple] = []
+
     for item in accepted:
         tn = item.get("number", "")
-        pkg = next((p for p in packages if p["tracking_number"] == tn), None)
+        pkg = pkg_by_tn.get(tn)
         if not pkg:
             continue
 
+        # Identical response to last time: only record that we checked. Delivered
+        # responses always take the full path so reactivated packages get closed.
+        raw_data = _dumps(item, sort_keys=True)
+        raw_data_hash = hashlib.blake2b(raw_data.encode(), digest_size=8).digest()
         track = item.get("track", {})
-
-        # Get status
         status_code = track.get("e", 0)
-        new_status = STATUS_MAP.get(status_code, f"Unknown ({status_code})")
+        new_status = STATUS_MAP.get(status_code) or f"Unknown ({status_code})"
         old_status = pkg["status"]
+        if (
+            status_code != 40
+            and raw_data_hash == pkg["raw_data_hash"]
+            and new_status == old_status
+        ):
+            unchanged_rows.append((now, pkg["id"]))
+            continue
 
-        # Parse events from z0 (latest tracking provider)
-        events = []
+        # Parse events from z0 (latest tracking provider) as (date, location, description)
         z0 = track.get("z0", {})
-        raw_events = z0.get("z", [])
-
-        for ev in raw_events:
-            events.append({
-                "date": ev.get("a", ""),
-                "location": ev.get("z", ""),
-                "description": ev.get("c", ""),
-            })
-
-        # Find new events
-        existing_events = conn.execute(
-            "SELECT event_date, description FROM tracking_events WHERE package_id = ?",
-            (pkg["id"],),
-        ).fetchall()
-        existing_set = {(e["event_date"], e["description"]) for e in existing_events}
-
-        new_events = [
-            ev for ev in events
-            if (ev["date"], ev["description"]) not in existing_set
+        # NULLs are distinct in the dedup index, so map JSON nulls to ""
+        events = [
+            (ev.get("a") or "", ev.get("z") or "", ev.get("c") or "")
+            for ev in z0.get("z", [])
         ]
 
-        # Store new events
-        for ev in new_events:
-            conn.execute(
-                """INSERT INTO tracking_events
-                   (package_id, event_date, location, description, status_code)
-                   VALUES (?, ?, ?, ?, ?)""",
-                (pkg["id"], ev["date"], ev["location"], ev["description"], str(status_code)),
-            )
-
-        # Update package record
-        latest_event = events[0] if events else None
-        update_fields = {
-            "status": new_status,
-            "last_checked": now,
-            "raw_data": json.dumps(item),
-            "updated_at": now,
-        }
-        if latest_event:
-            update_fields["last_event"] = latest_event["description"]
-            update_fields["last_event_date"] = latest_event["date"]
+        # Queue all events; the dedup index drops ones already stored
+        status_code_str = str(status_code)
+        event_rows.extend(
+            (pkg["id"], date, location, description, status_code_str)
+            for date, location, description in events
+        )
 
+        # Queue package record update
+        latest_event = None
+        if events:
+            date, location, description = events[0]
+            latest_event = {"date": date, "location": location, "description": description}
+        row = (
+            new_status,
+            now,
+            raw_data,
+            raw_data_hash,
+            now,
+            latest_event["description"] if latest_event else None,
+            latest_event["date"] if latest_event else None,
+        )
         if status_code == 40:
-            update_fields["delivered_date"] = now
-            update_fields["active"] = 0
-
-        set_clause = ", ".join(f"{k}=?" for k in update_fields)
-        conn.execute(
-            f"UPDATE packages SET {set_clause} WHERE id=?",
-            (*update_fields.values(), pkg["id"]),
+            delivered_rows.append((*row, now, pkg["id"]))
+        else:
+            package_rows.append((*row, pkg["id"]))
+
+        checked.append((pkg, old_status, new_status, latest_event))
+
+    checked_ids = [pkg["id"] for pkg, *_ in checked]
+    with conn:
+        counts_before = _count_events(conn, checked_ids)
+        conn.executemany(
+            """INSERT OR IGNORE INTO tracking_events
+               (package_id, event_date, location, description, status_code)
+               VALUES (?, ?, ?, ?, ?)""",
+            event_rows,
         )
+        counts_after = _count_events(conn, checked_ids)
+        conn.executemany(_UPDATE_PKG, package_rows)
+        conn.executemany(_UPDATE_PKG_DELIVERED, delivered_rows)
+        conn.executemany(
+            "UPDATE packages SET last_checked=? WHERE id=?",
+            unchanged_rows,
+        )
+
+    for pkg, old_status, new_status, latest_event in checked:
+        new_events_count = counts_after.get(pkg["id"], 0) - counts_before.get(pkg["id"], 0)
 
         # Send notification if status changed or new events found
-        if new_status != old_status or new_events:
+        if new_status != old_status or new_events_count:
+            tn = pkg["tracking_number"]
             tracking_url = get_tracking_url(tn, pkg["carrier"])
             update_info = {
                 "tracking_number": tn,
@@ -533,7 +729,7 @@ def check_updates(package_id: int | None = None) -> list[dict]:
                 "old_status": old_status,
                 "new_status": new_status,
                 "latest_event": latest_event,
-                "new_events_count": len(new_events),
+                "new_events_count": new_events_count,
                 "tracking_url": tracking_url,
             }
             updates.append(update_info)
@@ -544,32 +740,45 @@ def check_updates(package_id: int | None = None) -> list[dict]:
             print("=" * 50)
 
             status_emoji = STATUS_EMOJI.get(new_status, "📦")
+            status_change = f"{old_status} → {new_status}" if old_status != new_status else new_status
             print(f"  {status_emoji} {tn}: {status_change}")
             if latest_event:
                 print(f"     └─ {latest_event['description']}")
 
-    conn.commit()
-    conn.close()
-
     if not updates:
         print("📭 No new updates found")
 
     return updates
 
 
-def list_packages(active_only: bool = True) -> list[dict]:
-    """List tracked packages."""
+def iter_packages(active_only: bool = True) -> Iterator[dict]:
+    """Yield tracked packages one row at a time."""
     conn = get_db()
     if active_only:
         rows = conn.execute(
             "SELECT * FROM packages WHERE active = 1 ORDER BY created_at DESC"
-        ).fetchall()
+        )
     else:
         rows = conn.execute(
             "SELECT * FROM packages ORDER BY active DESC, created_at DESC"
-        ).fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+        )
+    for r in rows:
+        yield dict(r)
+
+
+def list_packages(active_only: bool = True) -> list[dict]:
+    """List tracked packages."""
+    return list(iter_packages(active_only))
+
+
+def count_packages(active_only: bool = True) -> int:
+    """Count tracked packages without loading them."""
+    conn = get_db()
+    if active_only:
+        row = conn.execute("SELECT COUNT(*) FROM packages WHERE active = 1").fetchone()
+    else:
+        row = conn.execute("SELECT COUNT(*) FROM packages").fetchone()
+    return row[0]
 
 
 def remove_package(tracking_number: str) -> dict:
@@ -584,10 +793,8 @@ def remove_package(tracking_number: str) -> dict:
         (tracking_number,),
     ).fetchone()
     if not row:
-        conn.close()
         return {"ok": False, "error": f"Package {tracking_number} not found in database"}
     if not row["active"]:
-        conn.close()
         return {"ok": False, "error": f"Package {tracking_number} is already inactive"}
 
     conn.execute(
@@ -595,7 +802,6 @@ def remove_package(tracking_number: str) -> dict:
         (row["id"],),
     )
     conn.commit()
-    conn.close()
     return {"ok": True, "message": f"Stopped tracking {tracking_number}"}
 
 
@@ -608,7 +814,6 @@ def get_package_details(tracking_number: str) -> dict | None:
         (tracking_number,),
     ).fetchone()
     if not pkg:
-        conn.close()
         return None
 
     events = conn.execute(
@@ -617,7 +822,6 @@ def get_package_details(tracking_number: str) -> dict | None:
            ORDER BY event_date DESC""",
         (pkg["id"],),
     ).fetchall()
-    conn.close()
 
     pkg_dict = dict(pkg)
     pkg_dict["tracking_url"] = get_tracking_url(
@@ -641,7 +845,6 @@ def get_api_quota() -> dict:
         "registrations_used": used,
         "registrations_remaining": max(0, 100 - used),
     }
-    conn.close()
 
     try:
         api_result = get_quota()